@@ -1,32 +1,85 @@
-from flask import Flask, render_template, jsonify, request
-import json
+from flask import Flask, render_template, request
+import orjson
 import os
 from datetime import datetime, timedelta
 import random
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import threading
-from collections import deque
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 app = Flask(__name__)
 
+class ResponseTimeWindow:
+    """Fixed-size window of response times with a running sum for O(1) averages"""
+    
+    def __init__(self, maxlen):
+        self.values = deque(maxlen=maxlen)
+        self.total = 0
+        self.lock = threading.Lock()
+    
+    def append(self, value):
+        with self.lock:
+            if len(self.values) == self.values.maxlen:
+                self.total -= self.values[0]
+            self.values.append(value)
+            self.total += value
+    
+    def average(self):
+        with self.lock:
+            if not self.values:
+                return 0
+            return self.total / len(self.values)
+
 # Global variables for monitoring
-response_times = deque(maxlen=100)  # Store last 100 response times
+response_times = ResponseTimeWindow(maxlen=100)  # Store last 100 response times
 service_status = {}
-last_check_time = 0
+history_dates = {'generated_on': None, 'dates': []}  # Last 90 days, rebuilt once per day
+history_cache = {'key': None, 'data': None}  # 90-day history for the current (date, config mtime)
+monitoring_started = False
+monitoring_lock = threading.Lock()
 
-# Add custom filter to Jinja2 environment
-@app.template_filter('get_day_status_color')
-def get_day_status_color_filter(status):
-    """Template filter for get_day_status_color function"""
-    return get_day_status_color(status)
+# Shared HTTP session so health checks reuse pooled TCP/TLS connections
+http_session = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=0)
+http_session.mount('http://', http_adapter)
+http_session.mount('https://', http_adapter)
+http_session.headers.update({'Connection': 'keep-alive'})
+
+# URLs that answered HEAD with 405/501 and are probed with GET instead
+head_unsupported_urls = set()
+
+# Parsed config.json, reloaded only when the file's mtime changes
+config_cache = {'mtime': None, 'data': None, 'status_names': {}, 'category_names': {},
+                'incidents_by_date': None}
+config_lock = threading.Lock()
+
+def get_config_path():
+    """Get absolute path to config.json"""
+    return os.path.join(os.path.dirname(__file__), 'config.json')
 
 def load_config():
-    """Load configuration from config.json"""
-    config_path = os.path.join(os.path.dirname(__file__), 'config.json')
+    """Load configuration from config.json, cached until the file changes"""
+    config_path = get_config_path()
     try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
+        with config_lock:
+            mtime = os.stat(config_path).st_mtime_ns
+            if mtime != config_cache['mtime']:
+                with open(config_path, 'rb') as f:
+                    data = orjson.loads(f.read())
+                # Build everything first so a failure never leaves a half-updated cache
+                status_names = build_status_names(data)
+                category_names = build_category_names(data)
+                config_cache.update({
+                    'mtime': mtime,
+                    'data': data,
+                    'status_names': status_names,
+                    'category_names': category_names,
+                    'incidents_by_date': None  # Built on first use by get_incidents_by_date
+                })
+            return config_cache['data']
     except FileNotFoundError:
         return {
             "ShowStatuses": False,
@@ -36,19 +89,86 @@ def load_config():
             "PastIncidents": []
         }
 
+def build_status_names(config):
+    """Map StatusID to status name, skipping malformed entries"""
+    status_names = {}
+    for status in config.get('StatusTypes', []):
+        if 'StatusID' in status:
+            # First match wins, like the original linear scan
+            status_names.setdefault(status['StatusID'], status.get('Status', 'Unknown'))
+    return status_names
+
+def build_category_names(config):
+    """Map CategoryID to category name, skipping malformed entries"""
+    category_names = {}
+    for category in config.get('StatusCategories', []):
+        if 'CategoryID' in category:
+            category_names.setdefault(category['CategoryID'], category.get('CategoryName', 'Unknown'))
+    return category_names
+
 def get_status_by_id(status_id, config):
     """Get status name by ID"""
-    for status in config.get('StatusTypes', []):
-        if status['StatusID'] == status_id:
-            return status['Status']
-    return 'Unknown'
+    if config is config_cache['data']:
+        status_names = config_cache['status_names']
+    else:
+        status_names = build_status_names(config)
+    return status_names.get(status_id, 'Unknown')
 
 def get_category_by_id(category_id, config):
     """Get category name by ID"""
-    for category in config.get('StatusCategories', []):
-        if category['CategoryID'] == category_id:
-            return category['CategoryName']
-    return 'Unknown'
+    if config is config_cache['data']:
+        category_names = config_cache['category_names']
+    else:
+        category_names = build_category_names(config)
+    return category_names.get(category_id, 'Unknown')
+
+def build_incidents_by_date(config):
+    """Map date string to the past incidents and unresolved statuses started that day"""
+    incidents_by_date = defaultdict(list)
+    
+    # Past incidents come first, then current unresolved statuses
+    tracked = [(incident, False) for incident in config.get('PastIncidents', [])]
+    tracked += [(status, True) for status in config.get('CurrentStatuses', [])
+                if not status.get('FixedAt')]
+    
+    for incident, is_current in tracked:
+        if not incident.get('StartedAt'):
+            continue
+        try:
+            date_str = datetime.fromtimestamp(incident['StartedAt']).strftime('%Y-%m-%d')
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            # Skip bad timestamps (e.g. milliseconds) instead of failing every view
+            print(f"Skipping incident with invalid StartedAt {incident['StartedAt']!r}: {e}")
+            continue
+        status_ids = incident.get('StatusID', [])
+        incidents_by_date[date_str].append({
+            'title': incident.get('StatusTitle', 'Ongoing Issue' if is_current else 'Unknown Incident'),
+            'type': get_incident_type(status_ids),
+            'description': incident.get('StatusDescription', ''),
+            'by': incident.get('By', ''),
+            'started_at': incident.get('StartedAt'),
+            'fixed_at': None if is_current else incident.get('FixedAt'),
+            'status_ids': status_ids,
+            'category_ids': incident.get('CategoryID', [])
+        })
+    
+    return dict(incidents_by_date)
+
+def get_incidents_by_date(config):
+    """Get the date-indexed incident map for a config"""
+    with config_lock:
+        if config is config_cache['data']:
+            if config_cache['incidents_by_date'] is None:
+                config_cache['incidents_by_date'] = build_incidents_by_date(config)
+            return config_cache['incidents_by_date']
+    return build_incidents_by_date(config)
+
+def get_config_version(config):
+    """Get the mtime of a cached config, or None if it didn't come from the cache"""
+    with config_lock:
+        if config is config_cache['data']:
+            return config_cache['mtime']
+    return None
 
 def format_timestamp(timestamp):
     """Format Unix timestamp to readable date"""
@@ -56,25 +176,28 @@ def format_timestamp(timestamp):
         return datetime.fromtimestamp(timestamp).strftime('%B %d, %Y at %I:%M %p')
     return None
 
+# Color class by StatusID, highest priority first:
+# Major Outage > Partial Outage > Under Maintenance > Degraded > Investigating > Operational
+status_color_priority = ((4, 'major-outage'), (3, 'partial-outage'), (5, 'maintenance'),
+                         (2, 'degraded'), (6, 'investigating'))
+
 def get_status_color(status_ids):
     """Get color class based on status IDs"""
-    if not status_ids:
-        return 'operational'
-    
-    # Priority: Major Outage > Partial Outage > Under Maintenance > Degraded > Investigating > Operational
-    priority_map = {4: 'major-outage', 3: 'partial-outage', 5: 'maintenance', 
-                   2: 'degraded', 6: 'investigating', 1: 'operational'}
-    
-    highest_priority = min(status_ids) if status_ids else 1
-    for status_id in status_ids:
-        if status_id in [4, 3, 5, 2, 6] and status_id < highest_priority:
-            highest_priority = status_id
-    
-    return priority_map.get(highest_priority, 'operational')
+    status_ids = set(status_ids)
+    return next((color_class for status_id, color_class in status_color_priority
+                 if status_id in status_ids), 'operational')
+
+# Incident type by StatusID, highest priority first
+incident_type_priority = ((4, 'major'), (3, 'partial'), (2, 'degraded'), (5, 'maintenance'))
+
+def get_incident_type(status_ids):
+    """Get incident type for the highest priority status ID"""
+    status_ids = set(status_ids)
+    return next((incident_type for status_id, incident_type in incident_type_priority
+                 if status_id in status_ids), 'investigating')
 
 def get_health_endpoints():
-    """Get health check endpoints from config"""
-    config = load_config()
+    """Get health check endpoints"""
     endpoints = {
         'API': 'https://royalguard-api.up.railway.app/',  # Your actual Royal Guard API
         'Discord Bot': 'https://discord.com/api/v10/gateway',
@@ -83,11 +206,32 @@ def get_health_endpoints():
     }
     return endpoints
 
+# Thread pool used to run health checks concurrently, one worker per endpoint
+health_check_executor = ThreadPoolExecutor(max_workers=len(get_health_endpoints()),
+                                           thread_name_prefix='health-check')
+
 def check_service_health(service_name, url):
     """Check health of a single service"""
     try:
-        start_time = time.time()
-        response = requests.get(url, timeout=5)
+        check_started = time.time()
+        response = None
+        
+        # HEAD avoids downloading the body; URLs that rejected it before go straight to GET
+        if url not in head_unsupported_urls:
+            start_time = time.time()
+            response = http_session.head(url, timeout=5, allow_redirects=True)
+            if response.status_code in [405, 501]:
+                head_unsupported_urls.add(url)
+                response = None
+        
+        if response is None:
+            # Streamed GET only gets what is left of the 5 second budget
+            remaining = 5 - (time.time() - check_started)
+            if remaining <= 0:
+                raise requests.exceptions.Timeout()
+            start_time = time.time()
+            response = http_session.get(url, timeout=remaining, stream=True)
+            response.close()
         end_time = time.time()
         
         response_time = round((end_time - start_time) * 1000, 2)  # Convert to ms
@@ -107,16 +251,30 @@ def check_service_health(service_name, url):
 
 def monitor_services():
     """Monitor all services and update global status"""
-    global service_status, response_times, last_check_time
+    global service_status, response_times
     
     endpoints = get_health_endpoints()
     total_response_time = 0
     successful_checks = 0
+    new_status = {}
     
-    for service_name, url in endpoints.items():
-        result = check_service_health(service_name, url)
-        service_status[service_name] = result
-        
+    # Run all checks concurrently so total latency is the slowest check, not the sum
+    futures = {health_check_executor.submit(check_service_health, service_name, url): service_name
+               for service_name, url in endpoints.items()}
+    try:
+        for future in as_completed(futures, timeout=6):
+            service_name = futures[future]
+            try:
+                new_status[service_name] = future.result()
+            except Exception:
+                new_status[service_name] = {'status': 'investigating', 'response_time': None}
+    except FuturesTimeoutError:
+        # Any check still pending past the deadline is treated as a timeout
+        for service_name in futures.values():
+            if service_name not in new_status:
+                new_status[service_name] = {'status': 'degraded', 'response_time': 5000}
+    
+    for result in new_status.values():
         if result['response_time'] is not None:
             total_response_time += result['response_time']
             successful_checks += 1
@@ -126,22 +284,23 @@ def monitor_services():
         avg_response_time = round(total_response_time / successful_checks, 2)
         response_times.append(avg_response_time)
     
-    last_check_time = time.time()
+    # Swap in the new snapshot in one step so readers never see a mix of old and new results
+    service_status = new_status
 
 def get_current_response_time():
     """Get current average response time"""
-    if not response_times:
-        return 0
-    return round(sum(response_times) / len(response_times), 2)
+    return round(response_times.average(), 2)
 
-def calculate_uptime():
+def calculate_uptime(statuses=None):
     """Calculate real uptime percentage based on service checks"""
-    if not service_status:
+    if statuses is None:
+        statuses = service_status  # Consistent snapshot
+    if not statuses:
         return 99.98  # Fallback for initial load
     
-    operational_services = sum(1 for status in service_status.values() 
+    operational_services = sum(1 for status in statuses.values() 
                              if status['status'] == 'operational')
-    total_services = len(service_status)
+    total_services = len(statuses)
     
     if total_services == 0:
         return 99.98
@@ -150,124 +309,60 @@ def calculate_uptime():
 
 def generate_90_day_history():
     """Generate 90 days of historical status data from real incidents"""
+    global history_cache
+    
     config = load_config()
-    history = []
-    today = datetime.now()
+    config_version = get_config_version(config)
+    key = (datetime.now().strftime('%Y-%m-%d'), config_version)
     
-    # Create a dictionary to map dates to incidents
-    incident_map = {}
+    # Memoized per day and config version; configs not from the cache are never memoized
+    cached = history_cache
+    if config_version is not None and cached['key'] == key:
+        return cached['data']
     
-    # Process past incidents from config
-    for incident in config.get('PastIncidents', []):
-        if incident.get('StartedAt'):
-            incident_date = datetime.fromtimestamp(incident['StartedAt'])
-            date_str = incident_date.strftime('%Y-%m-%d')
-            
-            # Determine status based on StatusID
-            status_ids = incident.get('StatusID', [])
-            if 4 in status_ids:  # Major Outage
-                status = 'major'
-                incident_type = 'major'
-            elif 3 in status_ids:  # Partial Outage
-                status = 'partial'
-                incident_type = 'partial'
-            elif 2 in status_ids:  # Degraded Performance
-                status = 'degraded'
-                incident_type = 'degraded'
-            elif 5 in status_ids:  # Under Maintenance
-                status = 'maintenance'
-                incident_type = 'maintenance'
-            else:
-                status = 'investigating'
-                incident_type = 'investigating'
-            
-            if date_str not in incident_map:
-                incident_map[date_str] = {
-                    'status': status,
-                    'incidents': []
-                }
-            
-            incident_map[date_str]['incidents'].append({
-                'title': incident.get('StatusTitle', 'Unknown Incident'),
-                'type': incident_type,
-                'description': incident.get('StatusDescription', ''),
-                'by': incident.get('By', ''),
-                'started_at': incident.get('StartedAt'),
-                'fixed_at': incident.get('FixedAt')
-            })
+    history = build_90_day_history(key[0], get_incidents_by_date(config))
+    if config_version is not None:
+        history_cache = {'key': key, 'data': history}
+    return history
+
+def build_90_day_history(today_str, incidents_by_date):
+    """Build the 90-day history ending on today_str from a date-indexed incident map"""
+    # Only status and counts are kept per day; details are served by /incident/<date>
+    incident_map = {
+        date_str: {'status': incidents[0]['type'], 'has_incidents': True, 'incident_count': len(incidents)}
+        for date_str, incidents in incidents_by_date.items()
+    }
     
-    # Process current unresolved statuses
-    for status in config.get('CurrentStatuses', []):
-        if not status.get('FixedAt') and status.get('StartedAt'):
-            incident_date = datetime.fromtimestamp(status['StartedAt'])
-            date_str = incident_date.strftime('%Y-%m-%d')
-            
-            # Determine status based on StatusID
-            status_ids = status.get('StatusID', [])
-            if 4 in status_ids:
-                current_status = 'major'
-                incident_type = 'major'
-            elif 3 in status_ids:
-                current_status = 'partial'
-                incident_type = 'partial'
-            elif 2 in status_ids:
-                current_status = 'degraded'
-                incident_type = 'degraded'
-            elif 5 in status_ids:
-                current_status = 'maintenance'
-                incident_type = 'maintenance'
-            else:
-                current_status = 'investigating'
-                incident_type = 'investigating'
-            
-            if date_str not in incident_map:
-                incident_map[date_str] = {
-                    'status': current_status,
-                    'incidents': []
-                }
-            
-            incident_map[date_str]['incidents'].append({
-                'title': status.get('StatusTitle', 'Ongoing Issue'),
-                'type': incident_type,
-                'description': status.get('StatusDescription', ''),
-                'by': status.get('By', ''),
-                'started_at': status.get('StartedAt'),
-                'fixed_at': None
-            })
-    
-    # Generate 90 days of history
-    for i in range(90):
-        date = today - timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        
-        if date_str in incident_map:
-            # Use real incident data
-            day_data = incident_map[date_str]
-            history.append({
-                'date': date_str,
-                'status': day_data['status'],
-                'incidents': day_data['incidents'],
-                'timestamp': int(date.timestamp())
-            })
-        else:
-            # Operational day
-            history.append({
-                'date': date_str,
-                'status': 'operational',
-                'incidents': [],
-                'timestamp': int(date.timestamp())
-            })
+    # Generate 90 days of history in one pass over the precomputed dates
+    operational_day = {'status': 'operational', 'has_incidents': False, 'incident_count': 0}
+    return [
+        {'date': date_str, 'timestamp': timestamp, **incident_map.get(date_str, operational_day)}
+        for date_str, timestamp in get_history_dates(today_str)
+    ]
+
+def get_history_dates(today_str):
+    """Get (date string, timestamp) pairs for the last 90 days, oldest first"""
+    global history_dates
     
-    return list(reversed(history))  # Return chronologically
+    if history_dates['generated_on'] != today_str:
+        today = datetime.strptime(today_str, '%Y-%m-%d')
+        days = [today - timedelta(days=i) for i in range(89, -1, -1)]
+        dates = [(day.date().isoformat(), int(day.timestamp())) for day in days]
+        # Replace the whole dict so readers never see a mismatched pair
+        history_dates = {'generated_on': today_str, 'dates': dates}
+    
+    return history_dates['dates']
+
+# Timeline color by day status; anything not listed is green
+day_status_colors = {'degraded': 'red', 'major': 'red', 'partial': 'yellow',
+                     'maintenance': 'yellow', 'investigating': 'yellow'}
 
 def get_day_status_color(status):
     """Get color class for day status"""
-    if status in ['degraded', 'major']:
-        return 'red'
-    elif status in ['partial', 'maintenance', 'investigating']:
-        return 'yellow'
-    else:
-        return 'green'
+    return day_status_colors.get(status, 'green')
+
+# Add custom filter to Jinja2 environment
+app.add_template_filter(get_day_status_color)
 
 @app.route('/')
 def index():
@@ -309,19 +404,16 @@ def index():
             }
             past_incidents.append(processed_incident)
     
-    # Check if we need to update service monitoring (every 30 seconds)
-    current_time = time.time()
-    if current_time - last_check_time > 30:
-        monitor_services()
-    
     # Process categories for system metrics with real monitoring
+    statuses = service_status  # Consistent snapshot
+    uptime = calculate_uptime(statuses)
     categories = []
     for category in config.get('StatusCategories', []):
         category_name = category['CategoryName']
         
         # Get real service status if available
-        if category_name in service_status:
-            service_info = service_status[category_name]
+        if category_name in statuses:
+            service_info = statuses[category_name]
             real_status = service_info['status']
             
             if real_status == 'operational':
@@ -353,7 +445,7 @@ def index():
             'name': category_name,
             'status': status_text,
             'status_class': status_class,
-            'uptime': calculate_uptime()
+            'uptime': uptime
         })
     
     # Generate 90-day history
@@ -364,7 +456,7 @@ def index():
                          current_statuses=current_statuses,
                          past_incidents=past_incidents,
                          categories=categories,
-                         overall_uptime=calculate_uptime(),
+                         overall_uptime=uptime,
                          history_data=history_data,
                          current_response_time=get_current_response_time())
 
@@ -374,63 +466,17 @@ def incident_detail(date):
     config = load_config()
     incidents_for_date = []
     
-    # Check past incidents for this date
-    for incident in config.get('PastIncidents', []):
-        if incident.get('StartedAt'):
-            incident_date = datetime.fromtimestamp(incident['StartedAt'])
-            if incident_date.strftime('%Y-%m-%d') == date:
-                # Determine incident type from StatusID
-                status_ids = incident.get('StatusID', [])
-                if 4 in status_ids:
-                    incident_type = 'major'
-                elif 3 in status_ids:
-                    incident_type = 'partial'
-                elif 2 in status_ids:
-                    incident_type = 'degraded'
-                elif 5 in status_ids:
-                    incident_type = 'maintenance'
-                else:
-                    incident_type = 'investigating'
-                
-                incidents_for_date.append({
-                    'title': incident.get('StatusTitle', 'Unknown Incident'),
-                    'type': incident_type,
-                    'description': incident.get('StatusDescription', ''),
-                    'by': incident.get('By', ''),
-                    'started_at': format_timestamp(incident.get('StartedAt')),
-                    'fixed_at': format_timestamp(incident.get('FixedAt')),
-                    'status_names': [get_status_by_id(sid, config) for sid in status_ids],
-                    'category_names': [get_category_by_id(cid, config) for cid in incident.get('CategoryID', [])]
-                })
-    
-    # Check current statuses for this date
-    for status in config.get('CurrentStatuses', []):
-        if status.get('StartedAt') and not status.get('FixedAt'):
-            status_date = datetime.fromtimestamp(status['StartedAt'])
-            if status_date.strftime('%Y-%m-%d') == date:
-                # Determine status type from StatusID
-                status_ids = status.get('StatusID', [])
-                if 4 in status_ids:
-                    status_type = 'major'
-                elif 3 in status_ids:
-                    status_type = 'partial'
-                elif 2 in status_ids:
-                    status_type = 'degraded'
-                elif 5 in status_ids:
-                    status_type = 'maintenance'
-                else:
-                    status_type = 'investigating'
-                
-                incidents_for_date.append({
-                    'title': status.get('StatusTitle', 'Ongoing Issue'),
-                    'type': status_type,
-                    'description': status.get('StatusDescription', ''),
-                    'by': status.get('By', ''),
-                    'started_at': format_timestamp(status.get('StartedAt')),
-                    'fixed_at': None,
-                    'status_names': [get_status_by_id(sid, config) for sid in status_ids],
-                    'category_names': [get_category_by_id(cid, config) for cid in status.get('CategoryID', [])]
-                })
+    for incident in get_incidents_by_date(config).get(date, []):
+        incidents_for_date.append({
+            'title': incident['title'],
+            'type': incident['type'],
+            'description': incident['description'],
+            'by': incident['by'],
+            'started_at': format_timestamp(incident['started_at']),
+            'fixed_at': format_timestamp(incident['fixed_at']),
+            'status_names': [get_status_by_id(sid, config) for sid in incident['status_ids']],
+            'category_names': [get_category_by_id(cid, config) for cid in incident['category_ids']]
+        })
     
     if not incidents_for_date:
         return render_template('incident_detail.html', 
@@ -446,25 +492,49 @@ def incident_detail(date):
 def api_status():
     """API endpoint for status data"""
     config = load_config()
-    return jsonify(config)
+    
+    # The config's mtime identifies its version, so unchanged configs skip serialization
+    config_version = get_config_version(config)
+    etag = str(config_version) if config_version is not None else None
+    if etag and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        # Keys are sorted to match Flask's default jsonify output
+        response = app.response_class(orjson.dumps(config, option=orjson.OPT_SORT_KEYS),
+                                      mimetype='application/json')
+    
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=5'
+    return response
 
 def start_monitoring_thread():
-    """Start background monitoring thread"""
+    """Start background monitoring thread (only once per process)"""
+    global monitoring_started
+    
+    with monitoring_lock:
+        if monitoring_started:
+            return
+        monitoring_started = True
+    
     def monitor_loop():
+        # Schedule against a monotonic deadline so check duration doesn't add drift
+        next_check = time.monotonic()
         while True:
             try:
                 monitor_services()
-                time.sleep(30)  # Check every 30 seconds
+                next_check += 30  # Check every 30 seconds
             except Exception as e:
                 print(f"Monitoring error: {e}")
-                time.sleep(60)  # Wait longer on error
+                next_check = time.monotonic() + 60  # Wait longer on error
+            time.sleep(max(0, next_check - time.monotonic()))
     
     thread = threading.Thread(target=monitor_loop, daemon=True)
     thread.start()
 
+# Start monitoring on import so it also runs under gunicorn
+start_monitoring_thread()
+
 if __name__ == '__main__':
-    # Start monitoring services in background
-    start_monitoring_thread()
-    
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)